@@ -0,0 +1,80 @@
+from concurrent.futures import Future
+from PIL import Image
+import numpy as np
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RemovalBatcher:
+    """
+    Coalesce concurrent rembg mask predictions into a single batched ONNX forward pass.
+
+    Instances stand in for a rembg session: pass one as ``session=`` to ``rembg.remove``
+    and every ``predict`` call is queued, grouped with whatever else arrives within
+    ``timeout`` seconds (up to ``max_size`` images) and run through the model together.
+    When nothing else is queued, the prediction runs immediately without waiting.
+    Only worth it where predictions really arrive concurrently, i.e. ``ImageProcessor.process_batch``;
+    single-request workers use the plain session.
+    """
+    # Normalisation constants used by rembg's U2-Net family of sessions
+    MEAN = (0.485, 0.456, 0.406)
+    STD = (0.229, 0.224, 0.225)
+    SIZE = (320, 320)
+
+    def __init__(self, session, max_size=8, timeout=0.02):
+        self.session = session
+        self.max_size = max_size
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        # Cleared for good after the first failed batched pass
+        self._batching = True
+        self._worker = threading.Thread(target=self._run, name='rembg-batcher', daemon=True)
+        self._worker.start()
+
+    def predict(self, img, *args, **kwargs):
+        """Queue an image for inference and block until its mask is ready."""
+        future = Future()
+        self._queue.put((img, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # A lone prediction runs at once; the batching window only opens under concurrency
+            if not self._queue.empty():
+                try:
+                    while len(batch) < self.max_size:
+                        batch.append(self._queue.get(timeout=self.timeout))
+                except queue.Empty:
+                    pass
+
+            masks = None
+            if len(batch) > 1 and self._batching:
+                try:
+                    masks = self._predict_batch([img for img, _ in batch])
+                except Exception as e:
+                    # e.g. a model exported with a fixed batch size of 1; stop paying for a double pass
+                    logger.warning(f"Batched inference failed, predicting images one at a time from now on: {str(e)}")
+                    self._batching = False
+
+            for index, (img, future) in enumerate(batch):
+                try:
+                    future.set_result(masks[index] if masks else self.session.predict(img))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _predict_batch(self, images):
+        """Run one forward pass over a stack of images and return a mask list per image."""
+        inputs = [self.session.normalize(img, self.MEAN, self.STD, self.SIZE) for img in images]
+        input_name = next(iter(inputs[0]))
+        batch = np.concatenate([item[input_name] for item in inputs], axis=0)
+        pred = self.session.inner_session.run(None, {input_name: batch})[0][:, 0, :, :]
+
+        masks = []
+        for img, item in zip(images, pred):
+            item = (item - item.min()) / (item.max() - item.min())
+            mask = Image.fromarray((item * 255).astype(np.uint8), mode='L')
+            masks.append([mask.resize(img.size, Image.Resampling.LANCZOS)])
+        return masks
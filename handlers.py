@@ -1,14 +1,51 @@
 from flask import request, send_file
 from PIL import Image
 import io
-from utils import ImageProcessor
+from utils import ImageProcessor, get_rembg_batcher
 
 from flask import request, jsonify
-from selenium_utils import SeleniumImageGenerator
+from selenium_utils import get_generated_image_url
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import numba
+import cv2
 import logging
+import os
+import tempfile
 
 logger = logging.getLogger(__name__)
 
+# Reject uploads that would decode to more pixels than this, whatever their file size
+MAX_IMAGE_PIXELS = 25_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Longest side JPEG uploads are decoded at, as far as libjpeg's 1/2, 1/4 and 1/8 decode scaling reaches
+MAX_DECODE_SIZE = 2048
+
+# Worker processes for CPU-bound image work. Set CPU_WORKERS=0 when the server itself already
+# runs one process per core (e.g. gunicorn -w N --threads 1) to process requests inline.
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 1))
+
+def _init_cpu_worker():
+    """Load the matting model once per worker process instead of on its first request."""
+    # Split the cores between workers so their ONNX, Numba and OpenCV thread pools do not
+    # oversubscribe the CPU
+    threads = max(1, (os.cpu_count() or 1) // max(1, CPU_WORKERS))
+    numba.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    get_rembg_batcher(intra_op_num_threads=threads)
+
+# CPU-bound image work runs in separate processes so requests are not serialised by the GIL.
+# Workers are spawned rather than forked so they never inherit a half-initialised ONNX session.
+CPU_POOL = ProcessPoolExecutor(
+    max_workers=CPU_WORKERS,
+    mp_context=multiprocessing.get_context('spawn'),
+    initializer=_init_cpu_worker
+) if CPU_WORKERS > 0 else None
+
+# Browser automation is I/O-bound and only needs threads
+IO_POOL = ThreadPoolExecutor(max_workers=8)
+
 class BackgroundRemovalHandler:
     @staticmethod
     def handle_request():
@@ -17,34 +54,78 @@ class BackgroundRemovalHandler:
             return 'No image uploaded', 400
         
         try:
-            # Get input image
-            image_file = request.files['image']
-            image = Image.open(image_file)
-            
-            # Process shadow parameters
+            # Read everything the worker needs while the request is still open
+            image_bytes = request.files['image'].read()
+            if not BackgroundRemovalHandler._within_pixel_limit(image_bytes):
+                return 'Image dimensions too large', 413
             shadow_params = BackgroundRemovalHandler._get_shadow_params()
+            background = BackgroundRemovalHandler._get_background()
             
-            # Remove background
-            no_bg_image = ImageProcessor.remove_background_enhanced(image)
+            alpha_matting = request.form.get('alpha_matting', 'false').lower() == 'true'
             
-            # Apply shadow if requested
-            if shadow_params['add_shadow']:
-                no_bg_image = ImageProcessor.add_shadow(
-                    no_bg_image,
-                    offset=shadow_params['offset'],
-                    blur_radius=shadow_params['blur'],
-                    shadow_color=shadow_params['color']
-                )
+            encode_options = BackgroundRemovalHandler._get_encode_options()
             
-            # Handle background replacement
-            result = BackgroundRemovalHandler._handle_background_replacement(no_bg_image)
+            task_args = (image_bytes, shadow_params, background, alpha_matting, encode_options)
+            if CPU_POOL:
+                result_path = CPU_POOL.submit(BackgroundRemovalHandler._process_image, *task_args).result()
+            else:
+                result_path = BackgroundRemovalHandler._process_image(*task_args)
             
-            # Return processed image
-            return BackgroundRemovalHandler._prepare_response(result)
+            # Stream the worker's output file; unlinking it now frees the disk space once sent
+            result_file = open(result_path, 'rb')
+            os.remove(result_path)
+            return send_file(result_file, mimetype=f"image/{encode_options['format'].lower()}")
             
         except Exception as e:
             return f'Error processing image: {str(e)}', 400
 
+    @staticmethod
+    def _process_image(image_bytes, shadow_params, background, alpha_matting, encode_options):
+        """Run the full removal pipeline in a worker process and return the path of the encoded result."""
+        image = BackgroundRemovalHandler._load_image(image_bytes)
+        
+        # Remove background
+        no_bg_image = ImageProcessor.remove_background_enhanced(image, alpha_matting=alpha_matting)
+        
+        # Apply shadow if requested
+        if shadow_params['add_shadow']:
+            no_bg_image = ImageProcessor.add_shadow(
+                no_bg_image,
+                offset=shadow_params['offset'],
+                blur_radius=shadow_params['blur'],
+                shadow_color=shadow_params['color']
+            )
+        
+        # Handle background replacement
+        result = ImageProcessor.replace_background(no_bg_image, background) if background else no_bg_image
+        
+        return BackgroundRemovalHandler._encode_result(result, encode_options)
+
+    @staticmethod
+    def _within_pixel_limit(data):
+        """Check the dimensions from the image header without decoding any pixel data."""
+        try:
+            width, height = Image.open(io.BytesIO(data)).size
+        except Image.DecompressionBombError:
+            return False
+        return width * height <= MAX_IMAGE_PIXELS
+
+    @staticmethod
+    def _load_image(data):
+        """Decode uploaded image bytes without touching the filesystem."""
+        image = Image.open(io.BytesIO(data))
+        
+        # Let libjpeg scale large photos down during decode; the matting model works at far lower resolution
+        if image.format == 'JPEG' and max(image.size) > MAX_DECODE_SIZE:
+            # draft() picks the largest scale that keeps both sides at or above the requested box,
+            # so request the floor of the reduced size rather than a square box
+            reduce = 1
+            while reduce < 8 and max(image.size) / reduce > MAX_DECODE_SIZE:
+                reduce *= 2
+            image.draft('RGB', (max(1, image.width // reduce), max(1, image.height // reduce)))
+        image.load()
+        return image
+
     @staticmethod
     def _get_shadow_params():
         """Extract shadow parameters from request."""
@@ -56,22 +137,32 @@ class BackgroundRemovalHandler:
         }
 
     @staticmethod
-    def _handle_background_replacement(image):
-        """Handle background replacement if requested."""
+    def _get_background():
+        """Return the requested background as raw image bytes, a colour string, or None."""
         if 'background_image' in request.files:
-            background_image = Image.open(request.files['background_image'])
-            return ImageProcessor.replace_background(image, background_image)
-        elif request.form.get('background'):
-            return ImageProcessor.replace_background(image, request.form.get('background'))
-        return image
+            return request.files['background_image'].read()
+        return request.form.get('background') or None
+
+    @staticmethod
+    def _get_encode_options():
+        """
+        Pick the output encoding from the query string.
+
+        PNG favours encode speed over size (?fast=1 skips compression entirely);
+        ?format=webp is much faster to encode and keeps the alpha channel.
+        """
+        if request.args.get('format', 'png').lower() == 'webp':
+            return {'format': 'WEBP', 'quality': 90, 'method': 0}
+        fast = request.args.get('fast', 'false').lower() in ('1', 'true')
+        return {'format': 'PNG', 'compress_level': 0 if fast else 1, 'optimize': False}
 
     @staticmethod
-    def _prepare_response(image):
-        """Prepare image for response."""
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return send_file(img_byte_arr, mimetype='image/png')
+    def _encode_result(image, encode_options):
+        """Encode the result straight to a temporary file so it never crosses the process boundary as bytes."""
+        suffix = '.' + encode_options['format'].lower()
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as result_file:
+            image.save(result_file, **encode_options)
+        return result_file.name
     
 
 class ImageGenerationHandler:
@@ -85,11 +176,8 @@ class ImageGenerationHandler:
             
             prompt = data['prompt']
             
-            # Initialize the image generator
-            generator = SeleniumImageGenerator()
-            
-            # Generate the image
-            image_url = generator.generate_image(prompt)
+            # Generate the image on a pooled, already running browser
+            image_url = IO_POOL.submit(get_generated_image_url, prompt).result()
             
             if not image_url:
                 return jsonify({'error': 'Failed to generate image'}), 500
@@ -1,9 +1,26 @@
 # main.py
+import logging
+import re
+
+import PIL
 from flask import Flask
-from handlers import BackgroundRemovalHandler, ImageGenerationHandler
+from handlers import BackgroundRemovalHandler, ImageGenerationHandler, IO_POOL
+from selenium_utils import get_browser_pool
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+def check_pillow_simd():
+    """Log whether the SIMD build of Pillow is installed (its versions end in .postN)."""
+    if re.search(r'\.post\d+$', PIL.__version__):
+        logger.info(f"Using Pillow-SIMD {PIL.__version__}")
+        return True
+    logger.warning(f"Pillow-SIMD not detected (PIL {PIL.__version__}); image filters will run on stock Pillow")
+    return False
+
+check_pillow_simd()
+
 @app.route('/remove-background', methods=['POST'])
 def remove_background_api():
     return BackgroundRemovalHandler.handle_request()
@@ -13,4 +30,6 @@ def generate_image_api():
     return ImageGenerationHandler.handle_request()
 
 if __name__ == '__main__':
+    # Launch the browsers in the background so the first generation requests do not pay for it
+    IO_POOL.submit(get_browser_pool().warm_up)
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
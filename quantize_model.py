@@ -0,0 +1,52 @@
+# quantize_model.py
+"""
+Produce an optimized copy of the u2net matting model.
+
+Usage: python quantize_model.py <input.onnx> <output.onnx> [--mode int8|uint8|fp16] [--slim]
+Then start the server with REMBG_MODEL_PATH=<output.onnx>.
+
+--slim runs onnxslim first to fold redundant reshape/transpose nodes (pip install onnxslim).
+--mode fp16 needs onnxconverter-common and is intended for GPU deployments.
+"""
+import argparse
+import os
+import tempfile
+import onnx
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+def slim(model_in, model_out):
+    """Remove no-op nodes from the graph."""
+    from onnxslim import slim as onnxslim
+    onnx.save(onnxslim(model_in), model_out)
+
+def quantize(model_in, model_out, weight_type=QuantType.QInt8):
+    """Quantize model weights to 8-bit so inference uses VNNI integer kernels where available."""
+    quantize_dynamic(model_in, model_out, weight_type=weight_type)
+
+def to_fp16(model_in, model_out):
+    """Convert model weights to FP16, keeping FP32 inputs and outputs."""
+    from onnxconverter_common import float16
+    model = float16.convert_float_to_float16(onnx.load(model_in), keep_io_types=True)
+    onnx.save(model, model_out)
+
+def optimize(model_in, model_out, mode='int8', use_slim=False):
+    """Optionally slim the graph, then convert the weights according to mode."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if use_slim:
+            slimmed = os.path.join(tmp_dir, 'slim.onnx')
+            slim(model_in, slimmed)
+            model_in = slimmed
+
+        if mode == 'fp16':
+            to_fp16(model_in, model_out)
+        else:
+            quantize(model_in, model_out, QuantType.QUInt8 if mode == 'uint8' else QuantType.QInt8)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Optimize the u2net matting model')
+    parser.add_argument('model_in')
+    parser.add_argument('model_out')
+    parser.add_argument('--mode', choices=['int8', 'uint8', 'fp16'], default='int8')
+    parser.add_argument('--slim', action='store_true')
+    args = parser.parse_args()
+    optimize(args.model_in, args.model_out, args.mode, args.slim)
@@ -1,14 +1,24 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import TimeoutException, WebDriverException, StaleElementReferenceException
+from selenium.common.exceptions import WebDriverException, StaleElementReferenceException
+import atexit
+import functools
+import json
+import re
+import shutil
+import statistics
 import time
 import logging
-from typing import Optional
-from urllib.parse import urlparse
+import os
+import queue
+import random
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
@@ -19,43 +29,349 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Command-line switches for every Chrome the generator launches
+CHROME_ARGUMENTS = (
+    "--headless",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--disable-extensions",
+    "--window-size=800,600",
+    "--disable-notifications",
+    "--disable-popup-blocking",
+    "--ignore-certificate-errors",
+    "--allow-insecure-localhost",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+)
+
+# Upper bound on each pooled profile's HTTP disk cache
+PROFILE_DISK_CACHE_BYTES = 64 * 1024 * 1024
+
+# chromedriver's own logging is never read
+CHROMEDRIVER_ARGUMENTS = ("--log-level=OFF",)
+
+CHROME_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2
+}
+
+# Subresources the generation flow never needs
+BLOCKED_URL_PATTERNS = [
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.svg", "*/fonts/*",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.mp4", "*.webm",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*"
+]
+
+# Site whose state is reset between attempts, and the generator page on it
+GENERATOR_ORIGIN = "https://deepai.org"
+GENERATOR_URL = GENERATOR_ORIGIN + "/machine-learning-model/text2img"
+
+# Origins the generation flow talks to; connections are opened as soon as a browser starts
+PRECONNECT_ORIGINS = ["https://deepai.org", "https://api.deepai.org"]
+
+# The request the submit button sends; other API calls on the page do not carry the result
+GENERATION_ENDPOINT = "api.deepai.org/api/text2img"
+
+# Fire-and-forget requests to each origin in arguments[0]; only the warmed connections matter
+PRECONNECT_SCRIPT = """
+for (const origin of arguments[0]) {
+    fetch(origin + '/', {mode: 'no-cors', credentials: 'omit'}).catch(() => {});
+}
+"""
+
+# https URL on api.deepai.org (or a subdomain of it) whose path ends in a JPEG/PNG extension.
+# The host must end right after the domain, so api.deepai.org.evil.com and api.deepai.org@evil.com
+# are rejected. The same source is compiled here and by PAGE_SCRIPT in the browser.
+IMAGE_URL_REGEX = r'^https://(?:[\w-]+\.)*api\.deepai\.org(?::\d+)?/[^?#]*\.(?:jpe?g|png)(?:[?#].*)?$'
+IMAGE_URL_PATTERN = re.compile(IMAGE_URL_REGEX)
+
+# Scrolls to and clicks the element with id arguments[0], falling back to a synthetic
+# click event; reports 'notfound' while it is missing or disabled
+CLICK_BY_ID_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const element = document.getElementById(arguments[0]);
+if (!element || element.disabled) return done('notfound');
+element.scrollIntoView({block: 'center'});
+// Clicked synchronously: animation frames never fire in a hidden tab
+try {
+    element.click();
+    done('ok');
+} catch (e) {
+    try {
+        element.dispatchEvent(new MouseEvent('click', {bubbles: true, cancelable: true, view: window}));
+        done('ok');
+    } catch (e2) {
+        done('fail');
+    }
+}
+"""
+
+# Elements that sit on top of the form and intercept clicks
+OVERLAY_ELEMENT_IDS = ["fs-sticky-footer", "cookie-banner", "ad-overlay"]
+
+# Known cookie-consent accept buttons, matched before falling back to a scan by button text
+CONSENT_SELECTORS = ["#onetrust-accept-btn-handler", ".consent-accept", "button[data-testid='accept']"]
+
+# Installed into every document before the page's own scripts run (or executed after load
+# when that is unavailable). It:
+#  - clicks the first visible cookie-consent control (a known selector, else by its text)
+#    and removes the overlay elements, once the DOM is ready and again on load;
+#  - once ARM_RESULT_SCRIPT has run just before submit, records the first outcome the page
+#    reaches, {url} or {error}, and hands it to a waiting execute_async_script callback if there
+#    is one. The URL is taken from the generation response (output_url) as soon as it arrives,
+#    with the result area <img> as a fallback; errors come from that response or the page's
+#    error banner, so failures return immediately. The image and banner shown at arming time
+#    belong to an earlier prompt and are ignored.
+PAGE_SCRIPT = r"""
+(() => {
+    if (window.__imgWatcherInstalled) return;
+    window.__imgWatcherInstalled = true;
+    window.__imgArmed = false;
+    window.__imgResult = null;
+    window.__imgResultCallback = null;
+
+    const overlayIds = OVERLAY_IDS;
+    const consentSelector = CONSENT_SELECTOR;
+    const isVisible = (element) => element.offsetParent !== null;
+    const findConsentButton = () => {
+        const known = Array.from(document.querySelectorAll(consentSelector)).find(isVisible);
+        if (known) return known;
+        return Array.from(document.querySelectorAll('button, a, [role="button"]')).find((element) => {
+            const text = element.textContent;
+            return (text.includes('Accept') || text.includes('I agree')) && isVisible(element);
+        });
+    };
+    const dismissOverlays = () => {
+        const consent = findConsentButton();
+        if (consent) consent.click();
+        for (const id of overlayIds) {
+            const element = document.getElementById(id);
+            if (element) element.remove();
+        }
+    };
+
+    const pattern = new RegExp(IMAGE_URL_REGEX);
+    const generationEndpoint = GENERATION_ENDPOINT;
+    const finish = (result) => {
+        if (!window.__imgArmed || window.__imgResult) return;
+        window.__imgResult = result;
+        if (window.__imgResultCallback) {
+            const callback = window.__imgResultCallback;
+            window.__imgResultCallback = null;
+            callback(result);
+        }
+    };
+    const reportFromBody = (text) => {
+        try {
+            const body = JSON.parse(text);
+            if (body.output_url && pattern.test(body.output_url)) finish({url: body.output_url});
+            else if (body.err || body.error) finish({error: String(body.err || body.error)});
+        } catch (e) {}
+    };
+
+    const originalFetch = window.fetch;
+    window.fetch = function (...args) {
+        return originalFetch.apply(this, args).then((response) => {
+            if (response.url.includes(generationEndpoint)) response.clone().text().then(reportFromBody);
+            return response;
+        });
+    };
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        this.addEventListener('load', () => {
+            if ((this.responseURL || '').includes(generationEndpoint) && (this.responseType === '' || this.responseType === 'text')) {
+                reportFromBody(this.responseText);
+            }
+        });
+        return originalSend.apply(this, args);
+    };
+
+    const observeResult = () => new MutationObserver(() => {
+        // A reused page still shows the previous outcome until the new one replaces it
+        const img = document.querySelector('.try-it-result-area img');
+        if (img && img.src !== window.__imgPreviousUrl && pattern.test(img.src)) return finish({url: img.src});
+        const error = document.querySelector('.error-message, .api-error');
+        const message = error ? error.innerText.trim() : '';
+        if (message && message !== window.__imgPreviousError) finish({error: message});
+    }).observe(document.body, {subtree: true, childList: true, characterData: true, attributes: true, attributeFilter: ['src']});
+
+    const onReady = () => {
+        dismissOverlays();
+        observeResult();
+    };
+    if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', onReady);
+    else onReady();
+    window.addEventListener('load', dismissOverlays);
+})();
+""".replace("OVERLAY_IDS", json.dumps(OVERLAY_ELEMENT_IDS)).replace(
+    "CONSENT_SELECTOR", json.dumps(",".join(CONSENT_SELECTORS))).replace(
+    "IMAGE_URL_REGEX", json.dumps(IMAGE_URL_REGEX)).replace(
+    "GENERATION_ENDPOINT", json.dumps(GENERATION_ENDPOINT))
+
+# Returns the prompt input of an already loaded generator page, or null if this is not a
+# watched generator page
+REUSE_PAGE_SCRIPT = """
+if (!window.__imgWatcherInstalled || !location.href.startsWith(arguments[0])) return null;
+return document.querySelector('.model-input-text-input');
+"""
+
+# Run right before the submit click: forgets any recorded outcome, notes the image and error
+# banner currently shown so they are not mistaken for the new result, and starts recording
+ARM_RESULT_SCRIPT = """
+const img = document.querySelector('.try-it-result-area img');
+const error = document.querySelector('.error-message, .api-error');
+window.__imgPreviousUrl = img ? img.src : null;
+window.__imgPreviousError = error ? error.innerText.trim() : null;
+window.__imgResult = null;
+window.__imgArmed = true;
+"""
+
+# Resolves with the recorded outcome as soon as the observer sees it, or null after arguments[0] ms
+RESULT_IMAGE_WAIT_SCRIPT = """
+const done = arguments[arguments.length - 1];
+if (window.__imgResult) return done(window.__imgResult);
+window.__imgResultCallback = done;
+setTimeout(() => {
+    if (window.__imgResultCallback === done) {
+        window.__imgResultCallback = null;
+        done(null);
+    }
+}, arguments[0]);
+"""
+
+# Resolves with the first element matching arguments[0] as soon as it is in the DOM,
+# or null after arguments[1] ms
+SELECTOR_WAIT_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const selector = arguments[0];
+const found = document.querySelector(selector);
+if (found) return done(found);
+const observer = new MutationObserver(() => {
+    const element = document.querySelector(selector);
+    if (element) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(element);
+    }
+});
+const timer = setTimeout(() => {
+    observer.disconnect();
+    done(null);
+}, arguments[1]);
+observer.observe(document, {childList: true, subtree: true});
+"""
+
+# Replaces the value of input arguments[0] with arguments[1] and notifies the page's listeners
+SET_INPUT_VALUE_SCRIPT = """
+const element = arguments[0];
+element.value = arguments[1];
+element.dispatchEvent(new Event('input', {bubbles: true}));
+element.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+
+# Longest pause between failed attempts
+MAX_BACKOFF_SECONDS = 4
+
+# How often a generation waiting for its result checks whether it has been cancelled
+RESULT_POLL_SECONDS = 1
+
+# Parallel generation attempts per request and the delay before each extra attempt starts.
+# Until HEDGE_MIN_SAMPLES successes are recorded the delay is RACE_STAGGER_SECONDS, long enough
+# that typical generations finish alone; after that it becomes HEDGE_FACTOR times their median,
+# so extra browsers are only spent on attempts that are running unusually slow.
+RACE_ATTEMPTS = 2
+RACE_STAGGER_SECONDS = 10.0
+HEDGE_FACTOR = 2.0
+HEDGE_MIN_SAMPLES = 10
+
+@functools.lru_cache(maxsize=None)
+def get_chromedriver_path() -> str:
+    """
+    Resolve the matching chromedriver once per process; webdriver_manager hits the network on every install().
+    CHROMEDRIVER_PATH pins a preinstalled binary and skips webdriver_manager entirely.
+    """
+    return os.environ.get('CHROMEDRIVER_PATH') or ChromeDriverManager().install()
+
+class ImageGenerationError(Exception):
+    """
+    A generation attempt failed in the page without the browser itself failing
+    """
+
+
+class ServiceError(ImageGenerationError):
+    """
+    DeepAI itself rejected or failed the generation
+    """
+
+
+class GenerationCancelled(ImageGenerationError):
+    """
+    The generation was abandoned through SeleniumImageGenerator.cancel
+    """
+
+
 class SeleniumImageGenerator:
     """
     A class to handle Selenium-based image generation using DeepAI's text2img model
     """
-    def __init__(self):
+    def __init__(self, profile_dir: Optional[str] = None, debugger_address: Optional[str] = None):
         self.driver = None
         self.wait = None
-        self.long_wait = None
+        # Persistent Chrome profile to start from; None uses a fresh temporary profile
+        self.profile_dir = profile_dir
+        # host:port of an already running Chrome to open a tab in instead of launching one
+        self.debugger_address = debugger_address
+        self.target_id = None
+        # A WebDriver session can only drive one page at a time
+        self.lock = threading.Lock()
+        # Generations served by this browser, used by BrowserPool to recycle it
+        self.uses = 0
+        self.page_script_preloaded = False
+        # Set after a successful generation; the next prompt reuses the loaded page
+        self.on_generator_page = False
+        # Set from another thread to stop the running generation; BrowserPool clears it on checkout
+        self.cancelled = threading.Event()
 
     def setup_driver(self) -> None:
         """
         Configure Chrome WebDriver with optimized settings and automatic driver management
         """
         chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-software-rasterizer")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--start-maximized")
-        chrome_options.add_argument("--disable-notifications")
-        chrome_options.add_argument("--disable-popup-blocking")
-        chrome_options.add_argument("--ignore-certificate-errors")
-        chrome_options.add_argument("--allow-insecure-localhost")
+        if self.debugger_address:
+            # Command-line switches and prefs belong to the shared browser process
+            chrome_options.add_experimental_option("debuggerAddress", self.debugger_address)
+        else:
+            for argument in CHROME_ARGUMENTS:
+                chrome_options.add_argument(argument)
+            if self.profile_dir:
+                # Reusing an initialised profile skips Chrome's first-run setup on every launch
+                chrome_options.add_argument(f"--user-data-dir={self.profile_dir}")
+                chrome_options.add_argument("--profile-directory=Default")
+                # Profiles persist across relaunches, so keep their HTTP cache from growing unbounded
+                chrome_options.add_argument(f"--disk-cache-size={PROFILE_DISK_CACHE_BYTES}")
+            chrome_options.add_experimental_option("prefs", dict(CHROME_PREFS))
+        # Only the DOM is needed; return from driver.get at DOMContentLoaded
+        chrome_options.page_load_strategy = 'eager'
 
         try:
-            # Use webdriver_manager to automatically download and manage the correct chromedriver
-            service = Service(ChromeDriverManager().install())
+            service = Service(executable_path=get_chromedriver_path(), service_args=list(CHROMEDRIVER_ARGUMENTS))
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            if self.debugger_address:
+                self.open_own_tab()
             self.driver.set_page_load_timeout(30)
-            self.wait = WebDriverWait(self.driver, 30)
-            self.long_wait = WebDriverWait(self.driver, 60)
+            # Poll every 100 ms rather than Selenium's 500 ms default; local round trips are a few ms
+            self.wait = WebDriverWait(self.driver, 30, poll_frequency=0.1,
+                                      ignored_exceptions=(StaleElementReferenceException,))
+            self.block_unneeded_resources()
+            self.install_page_script()
             
             # Verify Chrome is working
             self.driver.get("about:blank")
+            self.preconnect()
             logger.info("Chrome driver initialized successfully")
             
         except Exception as e:
@@ -72,164 +388,490 @@ class SeleniumImageGenerator:
                 
             raise
 
+    def open_own_tab(self) -> None:
+        """
+        Open a dedicated tab in the shared browser and drive it instead of whatever tab is focused.
+        It gets a window of its own so it stays the visible tab there and Chrome does not throttle it.
+        """
+        self.target_id = self.driver.execute_cdp_cmd(
+            "Target.createTarget", {"url": "about:blank", "newWindow": True})["targetId"]
+        self.driver.switch_to.window(self.target_id)
+
+    def block_unneeded_resources(self) -> None:
+        """
+        Stop Chrome fetching styles, fonts, trackers and downloads; only the DOM and JS are needed
+        """
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "deny"})
+        except Exception as e:
+            logger.debug(f"Could not configure resource blocking: {str(e)}")
+
+    def preconnect(self) -> None:
+        """
+        Open DNS/TLS connections to DeepAI in the background so the first page load reuses them
+        """
+        try:
+            self.driver.execute_script(PRECONNECT_SCRIPT, PRECONNECT_ORIGINS)
+        except Exception as e:
+            logger.debug(f"Preconnect failed: {str(e)}")
+
     def cleanup(self) -> None:
         """
         Clean up Selenium driver
         """
         if self.driver:
             try:
+                if self.target_id:
+                    # Quitting only detaches from a shared browser; close the tab explicitly
+                    self.driver.execute_cdp_cmd("Target.closeTarget", {"targetId": self.target_id})
                 self.driver.quit()
             except Exception as e:
                 logger.error(f"Error during driver cleanup: {str(e)}")
             finally:
                 self.driver = None
                 self.wait = None
-                self.long_wait = None
+                self.target_id = None
+                self.on_generator_page = False
+
+    def is_driver_alive(self) -> bool:
+        """
+        Check that the browser behind the driver still responds, with a single CDP round trip
+        """
+        if not self.driver:
+            return False
+        try:
+            self.driver.execute_cdp_cmd('Target.getTargetInfo', {})
+            return True
+        except Exception:
+            return False
 
-    def handle_cookie_popup(self) -> None:
+    def ensure_driver(self) -> None:
+        """
+        Reuse the running browser, recreating it only if it is missing or has crashed
         """
-        Handle any cookie consent popup that might appear
+        if not self.is_driver_alive():
+            self.cleanup()
+            self.setup_driver()
+
+    def warm_up(self) -> None:
+        """
+        Start the browser ahead of the first request and load the generator page once,
+        so the first real generation finds its HTML and scripts in the browser cache
         """
         try:
-            cookie_buttons = self.driver.find_elements(By.XPATH, "//*[contains(text(), 'Accept') or contains(text(), 'I agree')]")
-            for button in cookie_buttons:
-                if button.is_displayed():
-                    button.click()
-                    time.sleep(1)
-                    break
+            with self.lock:
+                self.ensure_driver()
+                self.driver.get(GENERATOR_URL)
         except Exception as e:
-            logger.debug(f"Cookie popup handling failed: {str(e)}")
+            logger.error(f"Browser warm-up failed: {str(e)}")
 
-    def remove_overlays(self) -> None:
+    def __enter__(self) -> "SeleniumImageGenerator":
         """
-        Remove any overlay elements that might interfere with clicking
+        Start the browser once for a batch of generate_image calls
         """
-        overlay_elements = [
-            "fs-sticky-footer",
-            "cookie-banner",
-            "ad-overlay"
-        ]
+        with self.lock:
+            self.ensure_driver()
+        return self
 
-        for element_id in overlay_elements:
-            try:
-                element = self.driver.find_element(By.ID, element_id)
-                self.driver.execute_script("arguments[0].remove();", element)
-            except Exception:
-                continue
-
-    def safe_click(self, element) -> bool:
-        """
-        Try multiple methods to click an element
-        """
-        methods = [
-            lambda: element.click(),
-            lambda: ActionChains(self.driver).move_to_element(element).click().perform(),
-            lambda: self.driver.execute_script("arguments[0].click();", element),
-            lambda: self.driver.execute_script(
-                "arguments[0].dispatchEvent(new MouseEvent('click', {bubbles: true, cancelable: true}));", 
-                element
-            )
-        ]
-
-        for method in methods:
-            try:
-                method()
-                return True
-            except Exception as e:
-                logger.debug(f"Click method failed: {str(e)}")
-                continue
-        return False
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.cleanup()
+
+    def click_by_id(self, element_id: str) -> None:
+        """
+        Find, scroll to and click an element in a single browser round trip per attempt,
+        waiting until it exists and is enabled
+        """
+        def clicked(driver):
+            status = driver.execute_async_script(CLICK_BY_ID_SCRIPT, element_id)
+            return status if status != 'notfound' else False
+
+        if self.wait.until(clicked, f"Timed out waiting for #{element_id}") != 'ok':
+            raise ImageGenerationError(f"Failed to click #{element_id}")
 
     def is_valid_image_url(self, url: str) -> bool:
         """
         Validate if the URL is a proper DeepAI image URL
         """
+        return isinstance(url, str) and len(url) <= 2000 and bool(IMAGE_URL_PATTERN.match(url))
+
+    def install_page_script(self) -> None:
+        """
+        Register the overlay killer and result watcher to run before every page's own scripts
+        """
         try:
-            parsed = urlparse(url)
-            return all([
-                parsed.scheme in ['http', 'https'],
-                'api.deepai.org' in parsed.netloc,
-                parsed.path.endswith(('.jpg', '.jpeg', '.png'))
-            ])
-        except Exception:
-            return False
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_SCRIPT})
+            self.page_script_preloaded = True
+        except Exception as e:
+            logger.debug(f"Could not preload page script: {str(e)}")
+            self.page_script_preloaded = False
 
-    def wait_for_image_src(self, element, timeout: int = 60) -> str:
+    def wait_for_selector(self, selector: str, timeout: int = 30):
         """
-        Wait for a valid image URL to be available and return it
+        Block in the browser until an element matching the CSS selector exists and return it
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                if element.is_displayed():
-                    src = element.get_attribute("src")
-                    if src and self.is_valid_image_url(src):
-                        return src
-            except StaleElementReferenceException:
-                element = self.wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".try-it-result-area img"))
-                )
-            except Exception as e:
-                logger.debug(f"Waiting for image: {str(e)}")
-            time.sleep(1)
-        raise TimeoutException("Timeout waiting for valid image URL")
+        self.driver.set_script_timeout(timeout + 5)
+        element = self.driver.execute_async_script(SELECTOR_WAIT_SCRIPT, selector, timeout * 1000)
+        if element is None:
+            raise ImageGenerationError(f"Timed out waiting for {selector}")
+        return element
 
-    def generate_image(self, prompt: str, max_retries: int = 3) -> Optional[str]:
+    def cancel(self) -> None:
+        """
+        Stop the running generation at its next check, leaving the browser usable.
+        Safe to call from any thread.
+        """
+        self.cancelled.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise GenerationCancelled("Generation cancelled")
+
+    def wait_for_image_src(self, timeout: int = 60) -> str:
+        """
+        Block in the browser until the observer reports a valid image URL and return it.
+        The wait is split into RESULT_POLL_SECONDS slices so a cancel takes effect promptly;
+        a result still resolves the moment it arrives.
+        """
+        deadline = time.monotonic() + timeout
+        self.driver.set_script_timeout(RESULT_POLL_SECONDS + 5)
+        result = None
+        while not result:
+            self.raise_if_cancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ImageGenerationError("Timeout waiting for valid image URL")
+            result = self.driver.execute_async_script(
+                RESULT_IMAGE_WAIT_SCRIPT, int(min(RESULT_POLL_SECONDS, remaining) * 1000))
+        if result.get('error'):
+            raise ServiceError(f"DeepAI reported an error: {result['error']}")
+        if not self.is_valid_image_url(result.get('url')):
+            raise ImageGenerationError(f"Unexpected image URL: {result.get('url')}")
+        return result['url']
+
+    def reset_session(self) -> None:
+        """
+        Clear DeepAI's cookies and storage so a retry starts clean without relaunching the browser
+        """
+        if self.debugger_address:
+            # Tabs in a shared browser share one cookie jar; clearing it would break other generations
+            return
+        try:
+            self.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                "origin": GENERATOR_ORIGIN,
+                "storageTypes": "cookies,local_storage,cache_storage",
+            })
+        except Exception as e:
+            logger.debug(f"Session reset failed: {str(e)}")
+
+    def generate_image(self, prompt: str, max_retries: int = 3, timeout: float = 180) -> Optional[str]:
         """
         Generate image from text prompt and return the image URL
         """
+        with self.lock:
+            return self._generate_image(prompt, max_retries, timeout)
+
+    def _generate_image(self, prompt: str, max_retries: int, timeout: float) -> Optional[str]:
+        """
+        Retry loop behind generate_image; the caller must hold self.lock.
+        Attempts stop at max_retries or once the overall timeout budget is spent.
+        """
+        deadline = time.monotonic() + timeout
         retry_count = 0
         image_url = None
 
-        while retry_count < max_retries:
+        while retry_count < max_retries and time.monotonic() < deadline:
             try:
-                self.setup_driver()
-                logger.info("Loading website...")
-                self.driver.get("https://deepai.org/machine-learning-model/text2img")
-                time.sleep(2)
-
-                self.handle_cookie_popup()
-                self.remove_overlays()
+                self.ensure_driver()
+                input_field = None
+                if self.on_generator_page:
+                    input_field = self.driver.execute_script(REUSE_PAGE_SCRIPT, GENERATOR_URL)
+                self.on_generator_page = False
+                reused = input_field is not None
 
-                logger.info(f"Entering prompt: {prompt}")
-                input_field = self.wait.until(EC.presence_of_element_located(
-                    (By.CLASS_NAME, "model-input-text-input")))
-                input_field.clear()
-                input_field.send_keys(prompt)
+                if not reused:
+                    logger.info("Loading website...")
+                    self.driver.get(GENERATOR_URL)
 
-                # Click the HD button
-                logger.info("Clicking the HD button...")
-                hd_button = self.wait.until(EC.element_to_be_clickable((By.ID, "modelHdButton")))
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", hd_button)
-                time.sleep(1)
+                    if not self.page_script_preloaded:
+                        self.driver.execute_script(PAGE_SCRIPT)
 
-                if not self.safe_click(hd_button):
-                    raise Exception("Failed to click HD button using all methods")
+                    input_field = self.wait_for_selector(".model-input-text-input")
 
-                logger.info("Attempting to click submit button...")
-                submit_button = self.wait.until(EC.element_to_be_clickable((By.ID, "modelSubmitButton")))
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", submit_button)
-                time.sleep(1)
+                logger.info(f"Entering prompt: {prompt}")
+                self.driver.execute_script(SET_INPUT_VALUE_SCRIPT, input_field, prompt)
 
-                if not self.safe_click(submit_button):
-                    raise Exception("Failed to click submit button using all methods")
+                # HD stays selected on a reused page
+                if not reused:
+                    logger.info("Clicking the HD button...")
+                    self.click_by_id("modelHdButton")
 
-                logger.info("Waiting for initial image element...")
-                img_element = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".try-it-result-area img")))
+                # Past this point the generation costs DeepAI work, so a cancelled attempt stops here
+                self.raise_if_cancelled()
+                logger.info("Attempting to click submit button...")
+                self.driver.execute_script(ARM_RESULT_SCRIPT)
+                self.click_by_id("modelSubmitButton")
 
                 logger.info("Waiting for valid image URL...")
-                image_url = self.wait_for_image_src(img_element)
+                remaining = deadline - time.monotonic()
+                image_url = self.wait_for_image_src(timeout=max(1, min(60, int(remaining))))
 
                 logger.info(f"Successfully generated image: {image_url}")
+                self.on_generator_page = True
                 return image_url
 
-            except Exception as e:
+            except GenerationCancelled:
+                # The page may still show this prompt's pending result; the next one reloads it
+                logger.info("Generation cancelled")
+                return None
+
+            except (WebDriverException, ImageGenerationError) as e:
                 retry_count += 1
                 logger.error(f"Attempt {retry_count} failed: {str(e)}")
+                # Page-level failures reuse the browser; only a dead browser is relaunched
+                if self.is_driver_alive():
+                    self.reset_session()
+                else:
+                    self.cleanup()
                 if retry_count >= max_retries:
-                    logger.error("Max retries reached. Returning None.")
-                    return None
-                time.sleep(2 ** retry_count)  # Exponential backoff
+                    break
+                # Only the network and the service need time to recover; page flakes retry at once
+                if isinstance(e, ServiceError) or 'net::ERR_' in str(e):
+                    # Jittered, capped exponential backoff so parallel browsers do not retry in lockstep
+                    backoff = min(MAX_BACKOFF_SECONDS, 1 + random.random() * 2 ** retry_count)
+                    time.sleep(min(backoff, max(0, deadline - time.monotonic())))
+
+        logger.error("Max retries or time budget reached. Returning None.")
+        return None
 
+
+class BrowserPool:
+    """
+    A bounded pool of warm SeleniumImageGenerator browsers.
+
+    Each request checks a browser out, so up to `size` generations run in parallel.
+    Browsers are recycled after `max_uses` generations or once they stop responding.
+    """
+    def __init__(self, size: int = 2, max_uses: int = 50, profile_root: Optional[str] = None,
+                 acquire_timeout: Optional[float] = None, debugger_address: Optional[str] = None):
+        self.size = size
+        self.max_uses = max_uses
+        # When set, every pooled generator is a tab in this one shared browser
+        self.debugger_address = debugger_address
+        self.acquire_timeout = acquire_timeout
+        # Point this at tmpfs (e.g. /dev/shm) only where it is sized for several Chrome profiles;
+        # container defaults are far too small, which is why Chrome runs with --disable-dev-shm-usage
+        self.profile_root = profile_root or tempfile.gettempdir()
+        # Chrome locks a profile to one process, so each pool (one per server worker process)
+        # keeps its profiles under a directory of its own
+        self._profile_base = None if debugger_address else tempfile.mkdtemp(prefix='chrome-pool-', dir=self.profile_root)
+        self._idle = queue.Queue()
+        self._slots = threading.BoundedSemaphore(size)
+        # Each live browser owns one on-disk profile; Chrome locks a profile to a single process
+        self._free_profiles = queue.Queue()
+        for index in range(size):
+            self._free_profiles.put(index)
+        # Every generator the pool has launched and not yet retired, idle or checked out
+        self._generators = set()
+        # Durations of recent successful generations, used to time hedged attempts
+        self._durations = deque(maxlen=100)
+        self._race_executor = ThreadPoolExecutor(max_workers=size * RACE_ATTEMPTS, thread_name_prefix='browser-race')
+
+    def _new_generator(self) -> Optional[SeleniumImageGenerator]:
+        try:
+            index = self._free_profiles.get_nowait()
+        except queue.Empty:
+            return None
+        if self.debugger_address:
+            generator = SeleniumImageGenerator(debugger_address=self.debugger_address)
+        else:
+            profile_dir = os.path.join(self._profile_base, f"profile-{index}")
+            os.makedirs(profile_dir, exist_ok=True)
+            generator = SeleniumImageGenerator(profile_dir=profile_dir)
+        generator.profile_index = index
+        self._generators.add(generator)
+        return generator
+
+    def _retire(self, generator: SeleniumImageGenerator) -> None:
+        generator.cleanup()
+        self._generators.discard(generator)
+        self._free_profiles.put(generator.profile_index)
+
+    def shutdown(self) -> None:
+        """
+        Quit every browser this pool launched, leaving any other Chrome on the host alone
+        """
+        self._race_executor.shutdown(wait=False, cancel_futures=True)
+        for generator in list(self._generators):
+            self._retire(generator)
+        if self._profile_base:
+            shutil.rmtree(self._profile_base, ignore_errors=True)
+
+    @contextmanager
+    def acquire(self) -> Iterator[SeleniumImageGenerator]:
+        """
+        Check out an idle browser, or a new one if none is idle.
+        Raises ImageGenerationError if no browser frees up within acquire_timeout seconds.
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ImageGenerationError("No browser became available in time")
+        try:
+            try:
+                generator = self._idle.get_nowait()
+            except queue.Empty:
+                generator = self._new_generator()
+            if generator is None:
+                raise ImageGenerationError("No browser profile is free")
+            generator.cancelled.clear()
+            try:
+                yield generator
             finally:
-                print('done')
+                self._release(generator)
+        finally:
+            self._slots.release()
+
+    def _release(self, generator: SeleniumImageGenerator) -> None:
+        generator.uses += 1
+        if generator.uses < self.max_uses and generator.is_driver_alive():
+            self._idle.put(generator)
+        else:
+            self._retire(generator)
+
+    def generate_image(self, prompt: str, max_retries: int = 3) -> Optional[str]:
+        """
+        Generate an image on the next free browser.
+        With more than one browser, staggered attempts race and the first valid URL wins.
+        """
+        if self.size < 2:
+            with self.acquire() as generator:
+                return generator.generate_image(prompt, max_retries)
+        return self._race(prompt, max_retries)
+
+    def _hedge_delay(self) -> float:
+        durations = list(self._durations)
+        if len(durations) < HEDGE_MIN_SAMPLES:
+            return RACE_STAGGER_SECONDS
+        return HEDGE_FACTOR * statistics.median(durations)
+
+    def _race(self, prompt: str, max_retries: int) -> Optional[str]:
+        finished = threading.Event()
+        delay = self._hedge_delay()
+        # Generators checked out by this race's attempts; the lock keeps a cancel from reaching
+        # a generator after it has gone back to the pool
+        running = set()
+        running_lock = threading.Lock()
+
+        def attempt(delay: float) -> Optional[Tuple[str, float]]:
+            # An attempt that has not reached a browser yet is dropped once another one succeeds
+            if finished.wait(delay):
+                return None
+            with self.acquire() as generator:
+                with running_lock:
+                    if finished.is_set():
+                        return None
+                    running.add(generator)
+                try:
+                    started = time.monotonic()
+                    image_url = generator.generate_image(prompt, max_retries)
+                finally:
+                    with running_lock:
+                        running.discard(generator)
+            if not image_url:
+                return None
+            finished.set()
+            return image_url, time.monotonic() - started
+
+        pending = {
+            self._race_executor.submit(attempt, index * delay)
+            for index in range(RACE_ATTEMPTS)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Generation attempt failed: {str(e)}")
+                    continue
+                if result:
+                    # Losers that have not submitted yet stop before they do; one already waiting
+                    # for DeepAI stops within RESULT_POLL_SECONDS and frees its browser
+                    with running_lock:
+                        finished.set()
+                        for generator in running:
+                            generator.cancel()
+                    for other in pending:
+                        other.cancel()
+                    # Only the winner's time is recorded; a slower loser would skew the median up
+                    image_url, duration = result
+                    self._durations.append(duration)
+                    return image_url
+        return None
+
+    def warm_up(self) -> None:
+        """
+        Launch every browser in the pool in parallel ahead of the first requests
+        """
+        # Each browser being warmed holds a slot like a checked-out one, so a request arriving
+        # meanwhile waits for it instead of finding every profile taken
+        generators = []
+        while len(generators) < self.size and self._slots.acquire(blocking=False):
+            generator = self._new_generator()
+            if generator is None:
+                self._slots.release()
+                break
+            generators.append(generator)
+        if not generators:
+            return
+        try:
+            with ThreadPoolExecutor(max_workers=len(generators)) as executor:
+                list(executor.map(lambda generator: generator.warm_up(), generators))
+        finally:
+            for generator in generators:
+                if generator.is_driver_alive():
+                    self._idle.put(generator)
+                else:
+                    self._retire(generator)
+                self._slots.release()
+
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Return the process-wide browser pool; BROWSER_POOL_SIZE sets how many browsers it keeps
+    and BROWSER_ACQUIRE_TIMEOUT how long a request waits for one of them.
+    BROWSER_PROFILE_ROOT sets where their profiles live (the temp dir by default).
+    With CHROME_DEBUGGER_ADDRESS set, the pool opens tabs in that running Chrome instead.
+    """
+    global _browser_pool
+    if _browser_pool is None:
+        with _browser_pool_lock:
+            if _browser_pool is None:
+                _browser_pool = BrowserPool(
+                    size=int(os.environ.get('BROWSER_POOL_SIZE', 2)),
+                    acquire_timeout=float(os.environ.get('BROWSER_ACQUIRE_TIMEOUT', 60)),
+                    debugger_address=os.environ.get('CHROME_DEBUGGER_ADDRESS'),
+                    profile_root=os.environ.get('BROWSER_PROFILE_ROOT'),
+                )
+                atexit.register(_browser_pool.shutdown)
+    return _browser_pool
+
+
+def get_generated_image_url(prompt: str) -> Optional[str]:
+    """
+    Generate an image for the prompt on the shared browser pool and return its URL
+    """
+    return get_browser_pool().generate_image(prompt)
+
+
+def get_generated_image_urls(prompts: List[str]) -> List[Optional[str]]:
+    """
+    Generate images for several prompts concurrently, one pooled browser each, and return
+    their URLs in prompt order
+    """
+    pool = get_browser_pool()
+    with ThreadPoolExecutor(max_workers=max(1, min(pool.size, len(prompts)))) as executor:
+        return list(executor.map(pool.generate_image, prompts))
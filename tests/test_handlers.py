@@ -0,0 +1,25 @@
+import io
+import os
+
+os.environ.setdefault('CPU_WORKERS', '0')
+
+from PIL import Image
+
+from handlers import BackgroundRemovalHandler, MAX_DECODE_SIZE
+
+
+def _jpeg(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def test_load_image_decodes_phone_jpeg_below_max_decode_size():
+    image = BackgroundRemovalHandler._load_image(_jpeg((4032, 3024)))
+    assert max(image.size) <= MAX_DECODE_SIZE
+    assert image.size == (2016, 1512)
+
+
+def test_load_image_keeps_small_jpeg_at_full_size():
+    image = BackgroundRemovalHandler._load_image(_jpeg((1200, 800)))
+    assert image.size == (1200, 800)
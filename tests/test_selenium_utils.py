@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip('selenium')
+
+from selenium_utils import IMAGE_URL_REGEX, PAGE_SCRIPT, is_valid_image_url
+
+
+@pytest.mark.parametrize('url', [
+    'https://api.deepai.org/job-view-file/abc/outputs/output.jpg',
+    'https://images.api.deepai.org/outputs/output.png?token=1',
+    'https://api.deepai.org:443/outputs/output.jpeg#preview',
+])
+def test_accepts_deepai_image_urls(url):
+    assert is_valid_image_url(url)
+
+
+@pytest.mark.parametrize('url', [
+    'https://api.deepai.org.evil.com/x.png',
+    'https://api.deepai.org@evil.com/x.png',
+    'https://evilapi.deepai.org.com/x.png',
+    'http://api.deepai.org/x.png',
+    'https://api.deepai.org/x.gif',
+    None,
+])
+def test_rejects_other_urls(url):
+    assert not is_valid_image_url(url)
+
+
+def test_page_script_uses_the_same_pattern():
+    assert json.dumps(IMAGE_URL_REGEX) in PAGE_SCRIPT
@@ -1,39 +1,208 @@
 from PIL import Image, ImageColor, ImageOps, ImageFilter
 from rembg import remove
+from rembg.sessions.u2net import U2netSession
+from rembg.sessions.u2net_custom import U2netCustomSession
+from batch_utils import RemovalBatcher
+from numba import njit, prange
+import onnxruntime as ort
 import numpy as np
+import cv2
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import math
+import os
+import threading
+
+# Execution providers in order of preference; unavailable ones are skipped
+PREFERRED_PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+
+def create_rembg_session(intra_op_num_threads=None):
+    """
+    Build the ONNX Runtime session used for matting.
+
+    intra_op_num_threads defaults to half the cores. Set REMBG_MODEL_PATH to an INT8-quantized model (see quantize_model.py) to use it
+    instead of the stock FP32 u2net weights.
+    """
+    sess_opts = ort.SessionOptions()
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_opts.intra_op_num_threads = intra_op_num_threads or max(1, (os.cpu_count() or 2) // 2)
+    providers = [p for p in PREFERRED_PROVIDERS if p in ort.get_available_providers()]
+
+    model_path = os.environ.get('REMBG_MODEL_PATH')
+    if model_path:
+        return U2netCustomSession('u2net_custom', sess_opts, providers, model_path=model_path)
+    return U2netSession('u2net', sess_opts, providers)
+
+_rembg_batcher = None
+_rembg_batcher_lock = threading.Lock()
+
+def get_rembg_batcher(intra_op_num_threads=None):
+    """
+    Return the batcher around the process-wide matting session, creating both on first use.
+
+    Predictions submitted concurrently through it are run as one forward pass.
+    intra_op_num_threads only applies to the call that creates the session.
+    """
+    global _rembg_batcher
+    if _rembg_batcher is None:
+        with _rembg_batcher_lock:
+            if _rembg_batcher is None:
+                _rembg_batcher = RemovalBatcher(create_rembg_session(intra_op_num_threads), max_size=8, timeout=0.02)
+    return _rembg_batcher
+
+def get_rembg_session():
+    """Return the process-wide matting session itself, for callers with nothing to batch with."""
+    return get_rembg_batcher().session
+
+# Longest side of the proxy image the matting mask is predicted on
+MATTING_MAX_SIZE = 1024
+
+# Largest downscale applied to the shadow before blurring it
+SHADOW_MAX_REDUCE = 4
+
+# Uploaded backgrounds already fitted to a foreground size, keyed by (sha1 of upload, size)
+# and bounded by the RGBA bytes they hold, since a single entry can be up to MAX_IMAGE_PIXELS * 4
+FITTED_BACKGROUND_CACHE_BYTES = 128 * 1024 * 1024
+_fitted_backgrounds = OrderedDict()
+_fitted_backgrounds_bytes = 0
+_fitted_backgrounds_lock = threading.Lock()
+
+@njit(parallel=True, cache=True, fastmath=True)
+def threshold_alpha(alpha):
+    """Snap near-transparent alpha to 0 and near-opaque alpha to 255 in one parallel pass."""
+    out = np.empty_like(alpha)
+    for i in prange(alpha.shape[0]):
+        for j in range(alpha.shape[1]):
+            a = alpha[i, j]
+            out[i, j] = 0 if a < 20 else (255 if a > 240 else a)
+    return out
+
+@njit(parallel=True, cache=True, fastmath=True)
+def composite_over_opaque(foreground, background):
+    """Blend an RGBA foreground over an opaque RGBA background in one parallel pass."""
+    height, width = foreground.shape[:2]
+    out = np.empty((height, width, 4), dtype=np.uint8)
+    for i in prange(height):
+        for j in range(width):
+            a = np.int32(foreground[i, j, 3])
+            for c in range(3):
+                out[i, j, c] = (np.int32(foreground[i, j, c]) * a + np.int32(background[i, j, c]) * (255 - a) + 127) // 255
+            out[i, j, 3] = 255
+    return out
+
+def _read_only_zeros(shape):
+    """Zeros with the same read-only flag as np.asarray(<PIL image>), so warm-up compiles the signature requests use."""
+    array = np.zeros(shape, dtype=np.uint8)
+    array.setflags(write=False)
+    return array
+
+@njit(parallel=True, cache=True, fastmath=True)
+def composite_over_color(foreground, color):
+    """Blend an RGBA foreground over a solid RGB colour without materialising a background image."""
+    height, width = foreground.shape[:2]
+    out = np.empty((height, width, 4), dtype=np.uint8)
+    for i in prange(height):
+        for j in range(width):
+            a = np.int32(foreground[i, j, 3])
+            for c in range(3):
+                out[i, j, c] = (np.int32(foreground[i, j, c]) * a + np.int32(color[c]) * (255 - a) + 127) // 255
+            out[i, j, 3] = 255
+    return out
+
+# Compile at import so the first request does not pay the JIT cost
+threshold_alpha(_read_only_zeros((2, 2)))
+composite_over_opaque(_read_only_zeros((2, 2, 4)), _read_only_zeros((2, 2, 4)))
+composite_over_color(_read_only_zeros((2, 2, 4)), np.zeros(3, dtype=np.uint8))
 
 class ImageProcessor:
     @staticmethod
     def refine_edges(image, alpha_matting_foreground_threshold=240,
                      alpha_matting_background_threshold=10, alpha_matting_erode_size=5):
         """Refine edges of the extracted foreground with improved preservation of details."""
-        img_array = np.array(image)
-        rgb = img_array[:, :, :3]
-        alpha = img_array[:, :, 3]
-        
-        # Refine alpha channel
-        alpha_image = Image.fromarray(alpha)
-        alpha_blurred = alpha_image.filter(ImageFilter.GaussianBlur(radius=1))
-        alpha_blurred = np.array(alpha_blurred)
-        alpha_blurred[alpha_blurred < 20] = 0
-        alpha_blurred[alpha_blurred > 240] = 255
-        alpha_feathered = Image.fromarray(alpha_blurred).filter(ImageFilter.GaussianBlur(radius=1))
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
         
-        # Combine refined alpha with original RGB
-        refined = np.dstack((rgb, np.array(alpha_feathered)))
-        return Image.fromarray(refined)
+        alpha = ImageProcessor.refine_alpha(np.asarray(image.getchannel('A')))
+        image.putalpha(Image.fromarray(alpha))
+        return image
 
     @staticmethod
-    def remove_background_enhanced(image):
-        """Remove the background with edge refinement."""
-        no_bg = remove(
-            image,
-            alpha_matting=True,
-            alpha_matting_foreground_threshold=240,
-            alpha_matting_background_threshold=10,
-            alpha_matting_erode_size=10
-        )
-        return ImageProcessor.refine_edges(no_bg)
+    def refine_alpha(alpha):
+        """
+        Threshold and feather an alpha plane given as a uint8 ndarray.
+
+        Thresholding first lets the two radius-1 blurs collapse into one radius-sqrt(2) blur.
+        """
+        alpha = threshold_alpha(alpha)
+        return cv2.GaussianBlur(alpha, (0, 0), sigmaX=math.sqrt(2), borderType=cv2.BORDER_REPLICATE)
+
+    @staticmethod
+    def remove_background_enhanced(image, alpha_matting=False):
+        """
+        Remove the background with edge refinement.
+
+        rembg's alpha matting is costly and largely redundant with refine_edges, so it only
+        runs when explicitly requested. Otherwise the mask is predicted on a proxy no larger
+        than MATTING_MAX_SIZE and scaled back up, since the model segments at 320x320 anyway.
+        """
+        # rembg uprights EXIF-rotated input before predicting; do it here so mask and pixels agree
+        image = ImageOps.exif_transpose(image)
+
+        if alpha_matting:
+            no_bg = remove(
+                image,
+                session=get_rembg_session(),
+                alpha_matting=True,
+                alpha_matting_foreground_threshold=240,
+                alpha_matting_background_threshold=10,
+                alpha_matting_erode_size=10
+            )
+            return ImageProcessor.refine_edges(no_bg)
+
+        return ImageProcessor._attach_mask(image, ImageProcessor._predict_mask(image, get_rembg_session()))
+
+    @staticmethod
+    def _predict_mask(image, session):
+        """Predict the raw mask on a proxy no larger than MATTING_MAX_SIZE, scaled back to the image size."""
+        proxy = image
+        if max(image.size) > MATTING_MAX_SIZE:
+            scale = MATTING_MAX_SIZE / max(image.size)
+            proxy_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            proxy = image.resize(proxy_size, Image.Resampling.BILINEAR)
+
+        mask = remove(proxy, session=session, only_mask=True)
+        if mask.size != image.size:
+            mask = mask.resize(image.size, Image.Resampling.BILINEAR)
+        return mask
+
+    @staticmethod
+    def _attach_mask(image, mask):
+        """Refine the mask and attach it as the alpha band, which is written exactly once."""
+        no_bg = image.convert('RGBA')
+        no_bg.putalpha(Image.fromarray(ImageProcessor.refine_alpha(np.asarray(mask))))
+        return no_bg
+
+    @staticmethod
+    def process_batch(images, alpha_matting=False):
+        """
+        Remove the background from several images at once.
+
+        Mask predictions run on threads so the shared RemovalBatcher can batch them. Refinement
+        and alpha matting stay serial: their parallel Numba kernels already use every core and
+        are not safe to enter from several threads under numba's workqueue threading layer.
+        """
+        if not images:
+            return []
+        if alpha_matting:
+            return [ImageProcessor.remove_background_enhanced(image, alpha_matting=True) for image in images]
+
+        images = [ImageOps.exif_transpose(image) for image in images]
+        batcher = get_rembg_batcher()
+        with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1)) as executor:
+            masks = list(executor.map(lambda image: ImageProcessor._predict_mask(image, batcher), images))
+        return [ImageProcessor._attach_mask(image, mask) for image, mask in zip(images, masks)]
 
     @staticmethod
     def add_shadow(image, offset=(20, 20), blur_radius=30, shadow_color=(0, 0, 0, 120)):
@@ -41,34 +210,84 @@ class ImageProcessor:
         image = image.convert("RGBA")
         width, height = image.size
 
-        shadow_layer = Image.new("RGBA", (width + abs(offset[0]), height + abs(offset[1])), (0, 0, 0, 0))
-        alpha = image.split()[3]
-        shadow = Image.new("RGBA", (width, height), shadow_color)
+        canvas_size = (width + abs(offset[0]), height + abs(offset[1]))
+        alpha = image.getchannel('A')
         
-        shadow_layer.paste(shadow, (max(offset[0], 0), max(offset[1], 0)), mask=alpha)
-        shadow_layer = shadow_layer.filter(ImageFilter.GaussianBlur(blur_radius))
+        # Build and blur the shadow on a single 8-bit band, then colourise it in one step
+        shadow_alpha = Image.new("L", canvas_size, 0)
+        shadow_opacity = shadow_color[3] if len(shadow_color) > 3 else 255
+        shadow_alpha.paste(shadow_opacity, (max(offset[0], 0), max(offset[1], 0)), mask=alpha)
         
-        final_image = Image.new("RGBA", shadow_layer.size, (0, 0, 0, 0))
-        final_image.paste(shadow_layer, (0, 0))
-        final_image.paste(image, (max(-offset[0], 0), max(-offset[1], 0)), mask=image.split()[3])
+        # A wide blur loses nothing at reduced resolution, so blur a downscaled copy
+        factor = min(SHADOW_MAX_REDUCE, max(1, int(blur_radius // 8)))
+        if factor > 1:
+            small = shadow_alpha.reduce(factor)
+            small = small.filter(ImageFilter.GaussianBlur(blur_radius / factor))
+            shadow_alpha = small.resize(canvas_size, Image.Resampling.BILINEAR)
+        else:
+            shadow_alpha = shadow_alpha.filter(ImageFilter.GaussianBlur(blur_radius))
+        
+        final_image = Image.new("RGBA", canvas_size, tuple(shadow_color[:3]) + (0,))
+        final_image.putalpha(shadow_alpha)
+        final_image.alpha_composite(image, (max(-offset[0], 0), max(-offset[1], 0)))
         
         return final_image
 
+    @staticmethod
+    def fit_background(background, size):
+        """Scale and crop a background image to cover the given size."""
+        background = background.convert('RGBA')
+        
+        # LANCZOS only pays off for large scale changes; the background sits behind the subject
+        ratio = max(background.size[0] / size[0], background.size[1] / size[1])
+        method = Image.Resampling.BILINEAR if 0.5 < ratio < 2.0 else Image.Resampling.LANCZOS
+        return ImageOps.fit(background, size, method=method)
+
+    @staticmethod
+    def fitted_background(data, size):
+        """Decode and fit an uploaded background, reusing the result for repeated (upload, size) pairs."""
+        key = (hashlib.sha1(data).digest(), size)
+        with _fitted_backgrounds_lock:
+            if key in _fitted_backgrounds:
+                _fitted_backgrounds.move_to_end(key)
+                return _fitted_backgrounds[key]
+        
+        background = ImageProcessor.fit_background(Image.open(io.BytesIO(data)), size)
+        nbytes = background.width * background.height * 4
+        # Backgrounds too large to share the budget with others are not worth evicting everything for
+        if nbytes > FITTED_BACKGROUND_CACHE_BYTES // 4:
+            return background
+        
+        global _fitted_backgrounds_bytes
+        with _fitted_backgrounds_lock:
+            if key not in _fitted_backgrounds:
+                _fitted_backgrounds[key] = background
+                _fitted_backgrounds_bytes += nbytes
+            while _fitted_backgrounds_bytes > FITTED_BACKGROUND_CACHE_BYTES:
+                _, evicted = _fitted_backgrounds.popitem(last=False)
+                _fitted_backgrounds_bytes -= evicted.width * evicted.height * 4
+        return background
+
     @staticmethod
     def replace_background(foreground, background):
         """Replace background of an image with optional shadow addition."""
-        foreground = foreground.convert('RGBA')
+        if foreground.mode != 'RGBA':
+            foreground = foreground.convert('RGBA')
         
-        if isinstance(background, Image.Image):
-            background = background.convert('RGBA')
-            background = ImageOps.fit(background, foreground.size, method=Image.Resampling.LANCZOS)
-        elif isinstance(background, str):
+        if isinstance(background, bytes):
+            background = ImageProcessor.fitted_background(background, foreground.size)
+        elif isinstance(background, Image.Image):
+            background = ImageProcessor.fit_background(background, foreground.size)
+        else:
+            # Solid colours are blended as a constant; no background image is built
             try:
-                bg_color = ImageColor.getrgb(background)
-                background = Image.new('RGBA', foreground.size, bg_color + (255,))
+                bg_color = ImageColor.getrgb(background) if isinstance(background, str) else (255, 255, 255)
             except ValueError:
-                background = Image.new('RGBA', foreground.size, (255, 255, 255, 255))
-        else:
-            background = Image.new('RGBA', foreground.size, (255, 255, 255, 255))
+                bg_color = (255, 255, 255)
+            color = np.array(bg_color[:3], dtype=np.uint8)
+            return Image.fromarray(composite_over_color(np.asarray(foreground), color))
         
+        # Opaque backgrounds (the common case for uploads) are blended in a single pass over both images
+        if background.getchannel('A').getextrema()[0] == 255:
+            return Image.fromarray(composite_over_opaque(np.asarray(foreground), np.asarray(background)))
         return Image.alpha_composite(background, foreground)
\ No newline at end of file